@@ -28,7 +28,7 @@ if __name__ == "__main__":
 
     result = fs.createReplica(replicaName=repName,
                               layers=[0,1,2,3,4,5,6,7,8],
-                              async=True,
+                              is_async=True,
                               returnAttachments=True,
                               returnAttachmentsDatabyURL=True,
                               attachmentsSyncDirection='bidirectional',
@@ -28,7 +28,7 @@ class Uploads(abstract.BaseAGOLClass):
         self._proxy_port = proxy_port
         self._proxy_url = proxy_url
         self._securityHandler = securityHandler
-        if self._url.lower().endswith("/uploads"):
+        if url.lower().endswith("/uploads"):
             self._url = url
         else:
             self._url = url + "/uploads"
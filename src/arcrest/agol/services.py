@@ -12,10 +12,23 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 import os
-import uuid
+import time
 import json
+import random
 import types
 from re import search
+from collections import deque
+from multiprocessing.pool import ThreadPool
+try:
+    import numpy as np
+    numpyFound = True
+except ImportError:
+    numpyFound = False
+try:
+    import orjson
+    orjsonFound = True
+except ImportError:
+    orjsonFound = False
 from ..common.general import create_uid
 from ..packages.six.moves import urllib_parse as urlparse
 from ..packages import six
@@ -30,12 +43,114 @@ from ..common.general import _date_handler, Feature
 from ..common.spatial import scratchFolder, scratchGDB, json_to_featureclass
 from ..common.spatial import get_OID_field, get_records_with_attachments
 from ..common.spatial import create_feature_layer, merge_feature_class
+from ..common.spatial import append_feature_class
 from ..common.spatial import featureclass_to_json, create_feature_class
 from ..common.spatial import get_attachment_data
 from ..common import geometry
 from ..hostedservice import AdminFeatureService, AdminFeatureServiceLayer
 from .._abstract.abstract import BaseSecurityHandler, BaseAGOLClass
-
+# edit payloads at least this large (characters) are posted as
+# multipart/form-data
+_FORM_DATA_SIZE = 1048576
+# sqlFormat values accepted by calculate
+_SQL_FORMATS = frozenset(("native", "standard"))
+#----------------------------------------------------------------------
+def _dumps(obj, default=None):
+    """ serializes obj to a compact JSON string, using orjson when it is
+        installed and the standard json module otherwise
+    """
+    if orjsonFound:
+        return orjson.dumps(obj, default=default,
+                            option=orjson.OPT_NON_STR_KEYS | \
+                            orjson.OPT_SERIALIZE_NUMPY | \
+                            orjson.OPT_PASSTHROUGH_DATETIME).decode('utf-8')
+    # no whitespace between tokens, matching orjson; coordinate arrays
+    # otherwise carry a space after every comma
+    return json.dumps(obj, default=default, separators=(',', ':'))
+#----------------------------------------------------------------------
+def _to_json(value):
+    """ returns dictionary and list parameter values as JSON text so
+        they are not form encoded as Python reprs, other values are
+        returned as is
+    """
+    if isinstance(value, (dict, list, tuple)):
+        return _dumps(value, default=_date_handler)
+    return value
+#----------------------------------------------------------------------
+def _resolve_sr(value):
+    """ returns the spatial reference value for a query from a
+        SpatialReference object (as its cached JSON), a wkid or an
+        already formed spatial reference dictionary/string
+    """
+    if isinstance(value, SpatialReference):
+        return value.asJSON
+    elif isinstance(value, (dict, six.string_types)) and \
+         not str(value).isdigit():
+        return value
+    # wkids given as digit strings are sent as numbers
+    return SpatialReference(wkid=int(value)).asJSON
+#----------------------------------------------------------------------
+def _oids_to_csv(oids):
+    """ returns object ids as the comma delimited string the REST API
+        expects.  Lists, tuples and numpy arrays are joined, any other
+        value (such as an already formatted string) is returned as is.
+    """
+    if numpyFound and isinstance(oids, np.ndarray):
+        # tolist() builds the Python ints in C; iterating the array would
+        # box every element as a numpy scalar first
+        return ",".join(map(str, oids.astype(np.int64, copy=False).tolist()))
+    elif isinstance(oids, (list, tuple)):
+        return ",".join(map(str, oids))
+    return oids
+#----------------------------------------------------------------------
+_FILTER_PARAMS = {
+    GeometryFilter : lambda f: f.filter,
+    TimeFilter : lambda f: {"time" : f.filter},
+    LayerDefinitionFilter : lambda f: {"layerDefs" : _to_json(f.filter)}
+}
+#----------------------------------------------------------------------
+def _pack(**kwargs):
+    """ returns the keyword arguments as a parameter dictionary, leaving
+        out the ones that are None
+    """
+    return dict((k, v) for k, v in kwargs.items() if v is not None)
+#----------------------------------------------------------------------
+_PUBLIC_ATTRIBUTES = {}
+def _public_attributes(cls):
+    """ returns the public attribute names of a service class, computed
+        once per class instead of a dir() scan on every initialization
+    """
+    try:
+        return _PUBLIC_ATTRIBUTES[cls]
+    except KeyError:
+        attributes = frozenset(attr for attr in dir(cls)
+                               if not attr.startswith('_'))
+        _PUBLIC_ATTRIBUTES[cls] = attributes
+        return attributes
+#----------------------------------------------------------------------
+def _is_text(value):
+    """ returns True for an already serialized (str or bytes) parameter
+        value, which is sent as is
+    """
+    return isinstance(value, (six.string_types, bytes))
+#----------------------------------------------------------------------
+def _add_filters(params, *filters):
+    """ adds the REST parameters of each filter object to params.  None
+        values and types that are not (subclasses of) an entry in
+        _FILTER_PARAMS are skipped.
+    """
+    for f in filters:
+        expand = _FILTER_PARAMS.get(type(f))
+        if expand is None:
+            # subclasses miss the exact type lookup
+            for kind, func in _FILTER_PARAMS.items():
+                if isinstance(f, kind):
+                    expand = func
+                    break
+            else:
+                continue
+        params.update(expand(f))
+    return params
 ########################################################################
 class FeatureService(abstract.BaseAGOLClass):
     """ contains information about a feature service """
@@ -70,10 +185,18 @@ class FeatureService(abstract.BaseAGOLClass):
     _proxy_port = None
     _securityHandler = None
     _serverURL = None
-    _json = None
     _json_dict = None
     _supportsApplyEditsWithGlobalIds = None
     _serviceItemId = None
+    _query_url = None
+    _queryRelatedRecords_url = None
+    _replicas_url = None
+    _createReplica_url = None
+    _unRegisterReplica_url = None
+    _uploads_url = None
+    _layers_url = None
+    _can_create_replica = None
+    _uploads = None
     #----------------------------------------------------------------------
     def __init__(self,
                  url,
@@ -81,6 +204,13 @@ class FeatureService(abstract.BaseAGOLClass):
                  initialize=False, proxy_url=None, proxy_port=None):
         """Constructor"""
         self._url = url
+        self._query_url = url + "/query"
+        self._queryRelatedRecords_url = url + "/queryRelatedRecords"
+        self._replicas_url = url + "/replicas"
+        self._createReplica_url = url + "/createReplica"
+        self._unRegisterReplica_url = url + "/unRegisterReplica"
+        self._uploads_url = url + "/uploads"
+        self._layers_url = url + "/layers"
 
         self._proxy_port = proxy_port
         self._proxy_url = proxy_url
@@ -110,16 +240,11 @@ class FeatureService(abstract.BaseAGOLClass):
                               proxy_url=self._proxy_url,
                               proxy_port=self._proxy_port)
         self._json_dict = json_dict
-        self._json = json.dumps(self._json_dict,
-                                default=_date_handler)
-        attributes = [attr for attr in dir(self)
-                    if not attr.startswith('__') and \
-                    not attr.startswith('_')]
+        attributes = _public_attributes(type(self))
         for k,v in json_dict.items():
-            if k == 'layers':
-                self._getLayers()
-            elif k == 'tables':
-                self._getTables()
+            if k in ('layers', 'tables'):
+                # loaded on first access by _loadLayers
+                continue
             elif k in attributes:
                 setattr(self, "_"+ k, json_dict[k])
             else:
@@ -127,9 +252,9 @@ class FeatureService(abstract.BaseAGOLClass):
     #----------------------------------------------------------------------
     def __str__(self):
         """ returns object as string """
-        if self._json is None:
+        if self._json_dict is None:
             self.__init()
-        return self._json
+        return json.dumps(self._json_dict, default=_date_handler)
     #----------------------------------------------------------------------
     def __iter__(self):
         """ iterator generator for public values/properties
@@ -190,6 +315,8 @@ class FeatureService(abstract.BaseAGOLClass):
         """ repopulates the properties of the service """
         self._tables = None
         self._layers = None
+        self._can_create_replica = None
+        self._uploads = None
         self.__init()
     #----------------------------------------------------------------------
     @property
@@ -284,15 +411,27 @@ class FeatureService(abstract.BaseAGOLClass):
         return self._syncEnabled
     #----------------------------------------------------------------------
     @property
+    def can_create_replica(self):
+        """ returns True if the service allows replicas to be created,
+            which requires sync to be enabled or the Extract capability
+        """
+        if self._can_create_replica is None:
+            self._can_create_replica = bool(self.syncEnabled) or \
+                "Extract" in (self.capabilities or "")
+        return self._can_create_replica
+    #----------------------------------------------------------------------
+    @property
     def uploads(self):
         """returns the class to perform the upload function.  it will
         only return the uploads class if syncEnabled is True.
         """
         if self.syncEnabled == True:
-            return Uploads(url=self._url + "/uploads",
-                           securityHandler=self._securityHandler,
-                           proxy_url=self._proxy_url,
-                           proxy_port=self._proxy_port)
+            if self._uploads is None:
+                self._uploads = Uploads(url=self._uploads_url,
+                                        securityHandler=self._securityHandler,
+                                        proxy_url=self._proxy_url,
+                                        proxy_port=self._proxy_port)
+            return self._uploads
         return None
     #----------------------------------------------------------------------
     @property
@@ -316,42 +455,53 @@ class FeatureService(abstract.BaseAGOLClass):
             self.__init()
         return self._documentInfo
     #----------------------------------------------------------------------
+    def _loadLayers(self):
+        """ creates the FeatureLayer objects for the layers and tables of
+            the service.  The metadata of every layer comes back from one
+            request to the /layers resource and is handed to each
+            FeatureLayer, so they do not request it one at a time.
+        """
+        params = {"f": "json"}
+        json_dict = self._get(self._layers_url, params,
+                              securityHandler=self._securityHandler,
+                              proxy_url=self._proxy_url,
+                              proxy_port=self._proxy_port)
+        preloaded = isinstance(json_dict, dict) and \
+                    ('layers' in json_dict or 'tables' in json_dict)
+        if not preloaded:
+            # fall back to the id listing in the service JSON, which is
+            # only requested again if it has not been loaded yet
+            json_dict = self._json_dict
+            if json_dict is None:
+                json_dict = self._get(self._url, params,
+                                      securityHandler=self._securityHandler,
+                                      proxy_url=self._proxy_url,
+                                      proxy_port=self._proxy_port)
+            if not isinstance(json_dict, dict):
+                json_dict = {}
+        url = self._url
+        securityHandler = self._securityHandler
+        proxy_url = self._proxy_url
+        proxy_port = self._proxy_port
+        self._layers, self._tables = [
+            [FeatureLayer(url="%s/%s" % (url, l['id']),
+                          securityHandler=securityHandler,
+                          proxy_port=proxy_port,
+                          proxy_url=proxy_url,
+                          json_dict=l if preloaded else None)
+             for l in json_dict.get(key, [])]
+            for key in ('layers', 'tables')]
+    #----------------------------------------------------------------------
     def _getLayers(self):
         """ gets layers for the featuer service """
         if self._layers is None:
-            self._layers = []
-            params = {"f": "json"}
-            json_dict = self._get(self._url, params,
-                                  securityHandler=self._securityHandler,
-                                  proxy_url=self._proxy_url,
-                                  proxy_port=self._proxy_port)
-            if isinstance(json_dict, dict) and \
-               'layers' in json_dict:
-                for l in json_dict['layers']:
-                    self._layers.append(FeatureLayer(url=self._url + "/%s" % l['id'],
-                                                     securityHandler=self._securityHandler,
-                                                     proxy_port=self._proxy_port,
-                                                     proxy_url=self._proxy_url))
-                    del l
+            self._loadLayers()
         return self._layers
     #----------------------------------------------------------------------
     def _getTables(self):
-        """ gets layers for the featuer service """
+        """ gets tables for the featuer service """
         if self._tables is None:
-            self._tables = []
-            params = {"f": "json"}
-            json_dict = self._get(self._url, params,
-                                     securityHandler=self._securityHandler,
-                                     proxy_url=self._proxy_url,
-                                     proxy_port=self._proxy_port)
-            if isinstance(json_dict, dict) and \
-               'tables' in json_dict:
-                for l in json_dict['tables']:
-                    self._tables.append(FeatureLayer(url=self._url + "/%s" % l['id'],
-                                                     securityHandler=self._securityHandler,
-                                                     proxy_port=self._proxy_port,
-                                                     proxy_url=self._proxy_url))
-                    del l
+            self._loadLayers()
         return self._tables
     @property
     def url(self):
@@ -448,34 +598,43 @@ class FeatureService(abstract.BaseAGOLClass):
               returnCountOnly=False,
               returnZ=False,
               returnM=False,
-              outSR=None
+              outSR=None,
+              geometryType=None,
+              spatialRel=None,
+              inSR=None
               ):
         """
            The Query operation is performed on a feature service resource
+           Inputs:
+              geometryFilter - a GeometryFilter object or a geometry JSON
+                               string.  For a string, describe it with
+                               geometryType, spatialRel and inSR.
+              geometryType - type of a geometry JSON string, for example
+                             esriGeometryPolygon.
+              spatialRel - spatial relationship of a geometry JSON string,
+                           for example esriSpatialRelIntersects.
+              inSR - spatial reference of a geometry JSON string.
         """
-        qurl = self._url + "/query"
+        qurl = self._query_url
         params = {"f": "json",
                   "returnGeometry": returnGeometry,
                   "returnIdsOnly": returnIdsOnly,
                   "returnCountOnly": returnCountOnly,
                   "returnZ": returnZ,
                   "returnM" : returnM}
-        if not layerDefsFilter is None and \
-           isinstance(layerDefsFilter, LayerDefinitionFilter):
-            params['layerDefs'] = layerDefsFilter.filter
-        if not geometryFilter is None and \
-           isinstance(geometryFilter, GeometryFilter):
-            gf = geometryFilter.filter
-            params['geometryType'] = gf['geometryType']
-            params['spatialRel'] = gf['spatialRel']
-            params['geometry'] = gf['geometry']
-            params['inSR'] = gf['inSR']
-        if not outSR is None and \
-           isinstance(outSR, geometry.SpatialReference):
-            params['outSR'] = outSR.asDictionary
-        if not timeFilter is None and \
-           isinstance(timeFilter, TimeFilter):
-            params['time'] = timeFilter.filter
+        _add_filters(params, layerDefsFilter, geometryFilter, timeFilter)
+        if _is_text(layerDefsFilter):
+            params['layerDefs'] = layerDefsFilter
+        if _is_text(geometryFilter):
+            params['geometry'] = geometryFilter
+        if _is_text(timeFilter):
+            params['time'] = timeFilter
+        params.update(_pack(geometryType=geometryType,
+                            spatialRel=spatialRel))
+        if inSR is not None:
+            params['inSR'] = _to_json(_resolve_sr(inSR))
+        if outSR is not None:
+            params['outSR'] = _to_json(_resolve_sr(outSR))
         res =  self._get(url=qurl,
                          param_dict=params,
                          securityHandler=self._securityHandler,
@@ -484,13 +643,34 @@ class FeatureService(abstract.BaseAGOLClass):
         if returnIdsOnly == False and returnCountOnly == False:
             if isinstance(res, str):
                 jd = json.loads(res)
-                return [FeatureSet.fromJSON(json.dumps(lyr)) for lyr in jd['layers']]
+                return [FeatureSet.fromJSON(lyr) for lyr in jd['layers']]
             elif isinstance(res, dict):
-                return [FeatureSet.fromJSON(json.dumps(lyr)) for lyr in res['layers']]
+                return [FeatureSet.fromJSON(lyr) for lyr in res['layers']]
             else:
                 return res
         return res
     #----------------------------------------------------------------------
+    def query_layers(self, max_workers=4, **kwargs):
+        """
+           Runs the same query against every layer and table in the
+           service.  The requests are network bound, so they are issued
+           from a thread pool instead of one after another.
+           Inputs:
+              max_workers - maximum number of concurrent requests
+              **kwargs - any parameters accepted by FeatureLayer.query
+           Output:
+              list of query results, in the order of layers then tables
+        """
+        lyrs = self.layers + self.tables
+        if len(lyrs) == 0:
+            return []
+        pool = ThreadPool(processes=max(1, min(max_workers, len(lyrs))))
+        try:
+            return pool.map(lambda lyr: lyr.query(**kwargs), lyrs)
+        finally:
+            pool.close()
+            pool.join()
+    #----------------------------------------------------------------------
     def query_related_records(self,
                               objectIds,
                               relationshipId,
@@ -556,26 +736,20 @@ class FeatureService(abstract.BaseAGOLClass):
                         the features have M values. Otherwise, M values are
                         not returned. The default is false.
         """
-        params = {
-            "f" : "json",
-            "objectIds" : objectIds,
-            "relationshipId" : relationshipId,
-            "outFields" : outFields,
-            "returnGeometry" : returnGeometry,
-            "returnM" : returnM,
-            "returnZ" : returnZ
-        }
-        if gdbVersion is not None:
-            params['gdbVersion'] = gdbVersion
-        if definitionExpression is not None:
-            params['definitionExpression'] = definitionExpression
+        params = _pack(f="json",
+                       objectIds=_oids_to_csv(objectIds),
+                       relationshipId=relationshipId,
+                       outFields=outFields,
+                       returnGeometry=returnGeometry,
+                       returnM=returnM,
+                       returnZ=returnZ,
+                       gdbVersion=gdbVersion,
+                       definitionExpression=definitionExpression,
+                       maxAllowableOffset=maxAllowableOffset,
+                       geometryPrecision=geometryPrecision)
         if outWKID is not None:
-            params['outSR'] =geometry.SpatialReference(outWKID).asDictionary
-        if maxAllowableOffset is not None:
-            params['maxAllowableOffset'] = maxAllowableOffset
-        if geometryPrecision is not None:
-            params['geometryPrecision'] = geometryPrecision
-        quURL = self._url + "/queryRelatedRecords"
+            params['outSR'] = _to_json(_resolve_sr(outWKID))
+        quURL = self._queryRelatedRecords_url
         res = self._get(url=quURL, param_dict=params,
                         securityHandler=self._securityHandler,
                         proxy_url=self._proxy_url, proxy_port=self._proxy_port)
@@ -588,7 +762,7 @@ class FeatureService(abstract.BaseAGOLClass):
             "f" : "json",
 
         }
-        url = self._url + "/replicas"
+        url = self._replicas_url
         return self._get(url, params,
                          securityHandler=self._securityHandler,
                          proxy_url=self._proxy_url,
@@ -605,7 +779,7 @@ class FeatureService(abstract.BaseAGOLClass):
             "f" : "json",
             "replicaID" : replica_id
         }
-        url = self._url + "/unRegisterReplica"
+        url = self._unRegisterReplica_url
         return self._post(url, params,
                           securityHandler=self._securityHandler,
                           proxy_url=self._proxy_url,
@@ -622,12 +796,49 @@ class FeatureService(abstract.BaseAGOLClass):
         params = {
             "f" : "json"
         }
-        url = self._url + "/replicas/" + replica_id
+        url = "%s/%s" % (self._replicas_url, replica_id)
         return self._get(url, param_dict=params,
                             securityHandler=self._securityHandler,
                             proxy_url=self._proxy_url,
                             proxy_port=self._proxy_port)
     #----------------------------------------------------------------------
+    def _layers_with_features(self, layers, geometryFilter=None,
+                              max_workers=4):
+        """ returns the layer ids (a list or comma delimited string, in
+            the form given) that have at least one feature matching the
+            geometry filter.  The count queries are run concurrently.
+            Layers whose count cannot be determined are kept.
+        """
+        as_string = isinstance(layers, six.string_types)
+        if as_string:
+            layers = [l.strip() for l in layers.split(",") if l.strip()]
+        layers = list(layers)
+        if len(layers) == 0:
+            return layers
+        params = _add_filters({"f" : "json",
+                               "where" : "1=1",
+                               "returnCountOnly" : True},
+                              geometryFilter)
+        def count(layer_id):
+            res = self._get(url="%s/%s/query" % (self._url, layer_id),
+                            param_dict=dict(params),
+                            securityHandler=self._securityHandler,
+                            proxy_url=self._proxy_url,
+                            proxy_port=self._proxy_port)
+            if isinstance(res, dict) and 'count' in res:
+                return res['count']
+            return None
+        pool = ThreadPool(processes=max(1, min(max_workers, len(layers))))
+        try:
+            counts = pool.map(count, layers)
+        finally:
+            pool.close()
+            pool.join()
+        layers = [layer_id for layer_id, c in zip(layers, counts) if c != 0]
+        if as_string:
+            return ",".join(layers)
+        return layers
+    #----------------------------------------------------------------------
     def createReplica(self,
                       replicaName,
                       layers,
@@ -637,13 +848,15 @@ class FeatureService(abstract.BaseAGOLClass):
                       transportType="esriTransportTypeUrl",
                       returnAttachments=False,
                       returnAttachmentsDatabyURL=False,
-                      async=False,
+                      is_async=False,
                       attachmentsSyncDirection="none",
                       syncModel="none",
                       dataFormat="json",
                       replicaOptions=None,
                       wait=False,
-                      out_path=None):
+                      out_path=None,
+                      prefilter=False,
+                      max_workers=4):
         """
         The createReplica operation is performed on a feature service
         resource. This operation creates the replica between the feature
@@ -682,7 +895,7 @@ class FeatureService(abstract.BaseAGOLClass):
             transportType is esriTransportTypeUrl, the JSON response is contained in a file,
             and the URL link to the file is returned. Otherwise, the JSON object is returned
             directly. The default is esriTransportTypeUrl.
-            If async is true, the results will always be returned as if transportType is
+            If is_async is true, the results will always be returned as if transportType is
             esriTransportTypeUrl. If dataFormat is sqlite, the transportFormat will always be
             esriTransportTypeUrl regardless of how the parameter is set.
             Values: esriTransportTypeUrl | esriTransportTypeEmbedded
@@ -697,7 +910,7 @@ class FeatureService(abstract.BaseAGOLClass):
             creating a replica. AttachmentsSyncDirection is currently a createReplica property
             and cannot be overridden during sync.
             Values: none, upload, bidirectional
-           async - If true, the request is processed as an asynchronous job, and a URL is
+           is_async - If true, the request is processed as an asynchronous job, and a URL is
             returned that a client can visit to check the status of the job. See the topic on
             asynchronous usage for more information. The default is false.
            syncModel - Client can specify the attachmentsSyncDirection when creating a replica.
@@ -711,51 +924,68 @@ class FeatureService(abstract.BaseAGOLClass):
             to specify parameters for registration of existing data for sync. The operation
             will create a replica but will not return data. The responseType returned in the
             createReplica response will be esriReplicaResponseTypeInfo.
-           wait - if async, wait to pause the process until the async operation is completed.
+           wait - if is_async, wait to pause the process until the async operation is completed.
            out_path - folder path to save the file
+           prefilter - if True, every layer is first queried for a count
+            (with the geometryFilter) and layers without features are
+            left out of the replica.  None is returned if no layer has
+            features.
+           max_workers - number of concurrent count queries when
+            prefilter is True.
         """
-        if self.syncEnabled == False and "Extract" not in self.capabilities:
+        if not self.can_create_replica:
             return None
-        url = self._url + "/createReplica"
+        if prefilter:
+            layers = self._layers_with_features(layers=layers,
+                                                geometryFilter=geometryFilter,
+                                                max_workers=max_workers)
+            if len(layers) == 0:
+                return None
+        url = self._createReplica_url
         dataformat = ["filegdb", "json", "sqlite", "shapefile"]
         params = {"f" : "json",
                   "replicaName": replicaName,
                   "returnAttachments": returnAttachments,
                   "returnAttachmentsDatabyURL": returnAttachmentsDatabyURL,
                   "attachmentsSyncDirection" : attachmentsSyncDirection,
-                  "async" : async,
+                  "async" : is_async,
                   "syncModel" : syncModel,
-                  "layers" : layers
+                  "layers" : _to_json(layers)
                   }
         if dataFormat.lower() in dataformat:
             params['dataFormat'] = dataFormat.lower()
         else:
             raise Exception("Invalid dataFormat")
         if layerQueries is not None:
-            params['layerQueries'] = layerQueries
-        if geometryFilter is not None and \
-           isinstance(geometryFilter, GeometryFilter):
-            params.update(geometryFilter.filter)
+            params['layerQueries'] = _to_json(layerQueries)
+        _add_filters(params, geometryFilter)
         if replicaSR is not None:
-            params['replicaSR'] = replicaSR
+            params['replicaSR'] = _to_json(replicaSR)
         if replicaOptions is not None:
-            params['replicaOptions'] = replicaOptions
+            params['replicaOptions'] = _to_json(replicaOptions)
         if transportType is not None:
             params['transportType'] = transportType
 
-        if async:
+        if is_async:
             if wait:
                 exportJob = self._post(url=url,
                                           param_dict=params,
                                           securityHandler=self._securityHandler,
                                           proxy_url=self._proxy_url,
                                           proxy_port=self._proxy_port)
-                status = self.replicaStatus(url=exportJob['statusUrl'])
-                while status['status'].lower() != "completed":
-                    status = self.replicaStatus(url=exportJob['statusUrl'])
-                    if status['status'].lower() == "failed":
+                replicaStatus = self.replicaStatus
+                statusUrl = exportJob['statusUrl']
+                delay = 1.0
+                while True:
+                    status = replicaStatus(url=statusUrl)
+                    state = status['status'].lower()
+                    if state == "completed":
+                        break
+                    elif state in ("failed", "cancelfailed", "cancelled"):
                         return status
-
+                    # back off exponentially (with jitter) up to 30 seconds
+                    time.sleep(delay + random.uniform(0, delay * 0.1))
+                    delay = min(delay * 2, 30.0)
                 res = status
 
             else:
@@ -782,11 +1012,16 @@ class FeatureService(abstract.BaseAGOLClass):
             elif 'URL' in res:
                 dlURL = res["URL"]
             if dlURL is not None:
+                # any replica format, including json, is streamed
+                # straight to disk
+                file_name = os.path.basename(urlparse.urlparse(dlURL).path)
                 return self._get(url=dlURL,
                                  securityHandler=self._securityHandler,
                                  proxy_url=self._proxy_url,
                                  proxy_port=self._proxy_port,
-                                 out_folder=out_path)
+                                 out_folder=out_path,
+                                 file_name=file_name or None,
+                                 force_download=True)
             else:
                 return res
         elif res is not None:
@@ -800,7 +1035,7 @@ class FeatureService(abstract.BaseAGOLClass):
                            returnIdsForAdds=False,
                            edits=None,
                            returnAttachmentDatabyURL=False,
-                           async=False,
+                           is_async=False,
                            syncDirection="snapshot",
                            syncLayers="perReplica",
                            editsUploadID=None,
@@ -817,7 +1052,7 @@ class FeatureService(abstract.BaseAGOLClass):
             "transportType" : transportType,
             "dataFormat" : dataFormat,
             "rollbackOnFailure" : rollbackOnFailure,
-            "async" : async,
+            "async" : is_async,
             "returnIdsForAdds": returnIdsForAdds,
             "syncDirection" : syncDirection,
             "returnAttachmentDatabyURL" : returnAttachmentDatabyURL
@@ -832,7 +1067,8 @@ class FeatureService(abstract.BaseAGOLClass):
                             param_dict=params,
                             securityHandler=self._securityHandler,
                             proxy_port=self._proxy_port,
-                            proxy_url=self._proxy_url)
+                            proxy_url=self._proxy_url,
+                            use_etag=True)
 ########################################################################
 class FeatureLayer(abstract.BaseAGOLClass):
     """
@@ -903,7 +1139,6 @@ class FeatureLayer(abstract.BaseAGOLClass):
     _supportsCoordinatesQuantization = None
     _supportsApplyEditsWithGlobalIds = None
     _serviceItemId = None
-    _json = None
     _json_dict = None
     _standardMaxRecordCount = None
     _tileMaxRecordCount = None
@@ -912,14 +1147,33 @@ class FeatureLayer(abstract.BaseAGOLClass):
     _hasGeometryProperties = None
     _supportsTruncate = None
     _supportsMultiScaleGeometry = None
+    _query_url = None
+    _queryRelatedRecords_url = None
+    _updateFeatures_url = None
+    _deleteFeatures_url = None
+    _applyEdits_url = None
+    _addFeatures_url = None
+    _calculate_url = None
     #----------------------------------------------------------------------
     def __init__(self, url,
                  securityHandler=None,
                  initialize=False,
                  proxy_url=None,
-                 proxy_port=None):
-        """Constructor"""
+                 proxy_port=None,
+                 json_dict=None):
+        """Constructor
+           json_dict - optional layer metadata already retrieved from the
+                       service; when given the layer is populated from it
+                       instead of requesting its own JSON
+        """
         self._url = url
+        self._query_url = url + "/query"
+        self._queryRelatedRecords_url = url + "/queryRelatedRecords"
+        self._updateFeatures_url = url + "/updateFeatures"
+        self._deleteFeatures_url = url + "/deleteFeatures"
+        self._applyEdits_url = url + "/applyEdits"
+        self._addFeatures_url = url + "/addFeatures"
+        self._calculate_url = url + "/calculate"
 
         self._proxy_port = proxy_port
         self._proxy_url = proxy_url
@@ -936,23 +1190,23 @@ class FeatureLayer(abstract.BaseAGOLClass):
             else:
                 self._securityHandler = securityHandler
 
-        if initialize:
+        if json_dict is not None:
+            self.__init(json_dict=json_dict)
+        elif initialize:
             self.__init()
     #----------------------------------------------------------------------
-    def __init(self):
+    def __init(self, json_dict=None):
         """ initializes the service """
-        params = {
-            "f" : "json",
-        }
-        json_dict = self._get(self._url, params,
-                                 securityHandler=self._securityHandler,
-                                 proxy_port=self._proxy_port,
-                                 proxy_url=self._proxy_url)
+        if json_dict is None:
+            params = {
+                "f" : "json",
+            }
+            json_dict = self._get(self._url, params,
+                                  securityHandler=self._securityHandler,
+                                  proxy_port=self._proxy_port,
+                                  proxy_url=self._proxy_url)
         self._json_dict = json_dict
-        self._json = json.dumps(json_dict, default=self._date_handler)
-        attributes = [attr for attr in dir(self)
-                      if not attr.startswith('__') and \
-                      not attr.startswith('_')]
+        attributes = _public_attributes(type(self))
         for k,v in json_dict.items():
             if k in attributes:
                 setattr(self, "_"+ k, json_dict[k])
@@ -971,9 +1225,9 @@ class FeatureLayer(abstract.BaseAGOLClass):
     #----------------------------------------------------------------------
     def __str__(self):
         """ returns object as string """
-        if self._json is None:
+        if self._json_dict is None:
             self.refresh()
-        return self._json
+        return json.dumps(self._json_dict, default=self._date_handler)
     #----------------------------------------------------------------------
     def __iter__(self):
         """ iterator generator for public values/properties
@@ -1480,10 +1734,8 @@ class FeatureLayer(abstract.BaseAGOLClass):
               JSON Repsonse
         """
         if self.hasAttachments == True:
-            attachURL = self._url + "/%s/addAttachment" % oid
+            attachURL = "%s/%s/addAttachment" % (self._url, oid)
             params = {'f':'json'}
-            parsed = urlparse.urlparse(attachURL)
-
             files = {'attachment': file_path}
             res = self._post(url=attachURL,
                              param_dict=params,
@@ -1503,7 +1755,7 @@ class FeatureLayer(abstract.BaseAGOLClass):
             Output:
                JSON response
         """
-        url = self._url + "/%s/deleteAttachments" % oid
+        url = "%s/%s/deleteAttachments" % (self._url, oid)
         params = {
             "f":"json",
             "attachmentIds" : "%s" % attachment_id
@@ -1522,7 +1774,7 @@ class FeatureLayer(abstract.BaseAGOLClass):
             Output:
                JSON response
         """
-        url = self._url + "/%s/updateAttachment" % oid
+        url = "%s/%s/updateAttachment" % (self._url, oid)
         params = {
             "f":"json",
             "attachmentId" : "%s" % attachment_id
@@ -1538,7 +1790,7 @@ class FeatureLayer(abstract.BaseAGOLClass):
     #----------------------------------------------------------------------
     def listAttachments(self, oid):
         """ list attachements for a given OBJECT ID """
-        url = self._url + "/%s/attachments" % oid
+        url = "%s/%s/attachments" % (self._url, oid)
         params = {
             "f":"json"
         }
@@ -1563,7 +1815,7 @@ class FeatureLayer(abstract.BaseAGOLClass):
             for attachment in attachments['attachmentInfos']:
                 if "id" in attachment and \
                    attachment['id'] == attachment_id:
-                    url = self._url + "/%s/attachments/%s" % (oid, attachment_id)
+                    url = "%s/%s/attachments/%s" % (self._url, oid, attachment_id)
                     return self._get(url=url, param_dict={"f":'json'},
                                      securityHandler=self._securityHandler,
                                      out_folder=out_folder,
@@ -1628,13 +1880,16 @@ class FeatureLayer(abstract.BaseAGOLClass):
               quanitizationParameters=None,
               returnCentroid=False,
               as_json=False,
+              fetch_all=False,
+              max_workers=4,
               **kwargs):
         """ queries a feature service based on a sql statement
             Inputs:
                 where - the selection sql statement
                 out_fields - the attribute fields to return
                 objectIds -  The object IDs of this layer or table to be
-                            queried.
+                            queried. A comma delimited string, a list or a
+                            numpy array of integers.
                 distance - The buffer distance for the input geometries.
                           The distance unit is specified by units. For
                           example, if the distance is 100, the query
@@ -1656,9 +1911,12 @@ class FeatureLayer(abstract.BaseAGOLClass):
                             search results for a given time.  The values in
                             the timeFilter should be as UTC timestampes in
                             milliseconds.  No checking occurs to see if they
-                            are in the right format.
+                            are in the right format.  An already formatted
+                            time string is sent as is.
                 geometryFilter - a GeometryFilter object to parse down a given
-                               query by another spatial dataset.
+                               query by another spatial dataset.  A geometry
+                               JSON string is sent as is (pass geometryType
+                               and inSR as keyword arguments).
                 maxAllowableOffset - This option can be used to specify the
                                      maxAllowableOffset to be used for
                                      generalizing geometries returned by
@@ -1742,6 +2000,17 @@ class FeatureLayer(abstract.BaseAGOLClass):
                                  centroid. The default is false.
                 as_json - If true, the query will return as the raw JSON.
                           The default is False.
+                fetch_all - If true, every record matching the query is
+                            returned by paging through the results in
+                            maxRecordCount sized requests. resultOffset
+                            and resultRecordCount are ignored. Layers that
+                            do not support pagination are queried by
+                            object id instead. If a request still comes
+                            back short, exceededTransferLimit is set on
+                            the result. The default is False.
+                max_workers - only valid if fetch_all is set to True. The
+                              number of pages requested concurrently. The
+                              default is 4.
                 returnFeatureClass - If true and arcpy is installed, the
                                      script will attempt to save the result
                                      of the query to a feature class.
@@ -1758,24 +2027,24 @@ class FeatureLayer(abstract.BaseAGOLClass):
                A list of Feature Objects (default) or a path to the output featureclass if
                returnFeatureClass is set to True.
          """
-        url = self._url + "/query"
-        params = {"f" : "json"}
-        params['where'] = where
-        params['outFields'] = out_fields
-        params['returnGeometry'] = returnGeometry
-        params['returnDistinctValues'] = returnDistinctValues
-        params['returnCentroid'] = returnCentroid
-        params['returnCountOnly'] = returnCountOnly
-        params['returnExtentOnly'] = returnExtentOnly
-        params['returnIdsOnly'] = returnIDsOnly
-        params['returnZ'] = returnZ
-        params['returnM'] = returnM
+        url = self._query_url
+        params = {"f" : "json",
+                  "where" : where,
+                  "outFields" : out_fields,
+                  "returnGeometry" : returnGeometry,
+                  "returnDistinctValues" : returnDistinctValues,
+                  "returnCentroid" : returnCentroid,
+                  "returnCountOnly" : returnCountOnly,
+                  "returnExtentOnly" : returnExtentOnly,
+                  "returnIdsOnly" : returnIDsOnly,
+                  "returnZ" : returnZ,
+                  "returnM" : returnM}
         if resultRecordCount:
             params['resultRecordCount'] = resultRecordCount
         if resultOffset:
             params['resultOffset'] = resultOffset
         if quanitizationParameters:
-            params['quanitizationParameters'] = quanitizationParameters
+            params['quanitizationParameters'] = _to_json(quanitizationParameters)
         if multipatchOption:
             params['multipatchOption'] = multipatchOption
         if orderByFields:
@@ -1784,48 +2053,55 @@ class FeatureLayer(abstract.BaseAGOLClass):
             params['groupByFieldsForStatistics'] = groupByFieldsForStatistics
         if statisticFilter and \
            isinstance(statisticFilter, filters.StatisticFilter):
-            params['outStatistics'] = statisticFilter.filter
+            params['outStatistics'] = _to_json(statisticFilter.filter)
+        elif _is_text(statisticFilter):
+            params['outStatistics'] = statisticFilter
         if outStatistics:
-            params['outStatistics'] = outStatistics
+            params['outStatistics'] = _to_json(outStatistics)
         if outSR:
-            params['outSR'] = outSR
+            params['outSR'] = _to_json(_resolve_sr(outSR))
         if maxAllowableOffset:
             params['maxAllowableOffset'] = maxAllowableOffset
         if gdbVersion:
             params['gdbVersion'] = gdbVersion
         if geometryPrecision:
             params['geometryPrecision'] = geometryPrecision
+        objectIds = _oids_to_csv(objectIds)
         if objectIds:
             params['objectIds'] = objectIds
         if distance:
             params['distance'] = distance
         if units:
             params['units'] = units
-        if timeFilter and \
-           isinstance(timeFilter, TimeFilter):
-            for k,v in timeFilter.filter.items():
-                params[k] = v
-        elif isinstance(timeFilter, dict):
+        _add_filters(params, timeFilter, geometryFilter)
+        if isinstance(timeFilter, dict):
             for k,v in timeFilter.items():
                 params[k] = v
-        if geometryFilter and \
-           isinstance(geometryFilter, GeometryFilter):
-            for k,v in geometryFilter.filter.items():
-                params[k] = v
-        elif geometryFilter and \
-             isinstance(geometryFilter, dict):
+        elif _is_text(timeFilter):
+            params['time'] = timeFilter
+        if isinstance(geometryFilter, dict):
             for k,v in geometryFilter.items():
-                params[k] = v
+                params[k] = _to_json(v)
+        elif _is_text(geometryFilter):
+            params['geometry'] = geometryFilter
         if len(kwargs) > 0:
             for k,v in kwargs.items():
-                params[k] = v
+                params[k] = _to_json(v)
                 del k,v
 
-        result = self._post(url=url,
-                            securityHandler=self._securityHandler,
-                            param_dict=params,
-                            proxy_url=self._proxy_url,
-                            proxy_port=self._proxy_port)
+        if fetch_all and \
+           not returnCountOnly and \
+           not returnIDsOnly and \
+           not returnExtentOnly:
+            result = self._query_all(url=url,
+                                     params=params,
+                                     max_workers=max_workers)
+        else:
+            result = self._post(url=url,
+                                securityHandler=self._securityHandler,
+                                param_dict=params,
+                                proxy_url=self._proxy_url,
+                                proxy_port=self._proxy_port)
         if 'error' in result:
             raise ValueError(result)
         if as_json or \
@@ -1835,24 +2111,116 @@ class FeatureLayer(abstract.BaseAGOLClass):
         elif returnFeatureClass and\
              not returnCountOnly and \
              not returnIDsOnly:
-            uid = create_uid()
-            if out_fc is None:
-                out_fc = os.path.join(scratchGDB(),
-                                      "a{fid}".format(fid=uid))
-            text = json.dumps(result)
-            temp = scratchFolder() + os.sep + uid + ".json"
-            with open(temp, 'wb') as writer:
-                if six.PY3:
-                    text = bytes(text, 'UTF-8')
-                writer.write(text)
-                writer.flush()
-                del writer
-            fc = json_to_featureclass(json_file=temp,
-                                      out_fc=out_fc)
-            os.remove(temp)
-            return fc
+            return self._to_featureclass(result=result, out_fc=out_fc)
+        else:
+            return FeatureSet.fromJSON(jsonValue=result)
+        return result
+    #----------------------------------------------------------------------
+    def _to_featureclass(self, result, out_fc=None):
+        """ saves a query result (dictionary) to a feature class and
+            returns its path.  If out_fc is None, the feature class is
+            saved to the scratch File Geodatabase with a random name.
+        """
+        uid = create_uid()
+        if out_fc is None:
+            out_fc = os.path.join(scratchGDB(),
+                                  "a{fid}".format(fid=uid))
+        text = json.dumps(result)
+        temp = scratchFolder() + os.sep + uid + ".json"
+        with open(temp, 'wb') as writer:
+            if six.PY3:
+                text = bytes(text, 'UTF-8')
+            writer.write(text)
+            writer.flush()
+            del writer
+        fc = json_to_featureclass(json_file=temp,
+                                  out_fc=out_fc)
+        os.remove(temp)
+        return fc
+    #----------------------------------------------------------------------
+    def _query_page(self, url, params, offset, count):
+        """ queries a single page of results starting at offset """
+        page_params = dict(params)
+        page_params['resultOffset'] = offset
+        page_params['resultRecordCount'] = count
+        return self._post(url=url,
+                          securityHandler=self._securityHandler,
+                          param_dict=page_params,
+                          proxy_url=self._proxy_url,
+                          proxy_port=self._proxy_port)
+    #----------------------------------------------------------------------
+    def _query_ids(self, url, params, oids):
+        """ queries the features with the given object ids """
+        chunk_params = dict(params)
+        chunk_params['objectIds'] = _oids_to_csv(oids)
+        return self._post(url=url,
+                          securityHandler=self._securityHandler,
+                          param_dict=chunk_params,
+                          proxy_url=self._proxy_url,
+                          proxy_port=self._proxy_port)
+    #----------------------------------------------------------------------
+    def _query_all(self, url, params, max_workers=4):
+        """ returns every record matching the query parameters.  The
+            total is requested first, then the pages are queried
+            concurrently and their features are combined in order.
+            Layers that support pagination are paged with resultOffset,
+            other layers are queried in chunks of object ids.
+        """
+        page = self.maxRecordCount or 1000
+        caps = self.advancedQueryCapabilities or {}
+        paginate = caps.get('supportsPagination', False)
+        count_params = dict(params)
+        if paginate:
+            count_params['returnCountOnly'] = True
+        else:
+            count_params['returnIdsOnly'] = True
+        res = self._post(url=url,
+                         securityHandler=self._securityHandler,
+                         param_dict=count_params,
+                         proxy_url=self._proxy_url,
+                         proxy_port=self._proxy_port)
+        if 'error' in res:
+            return res
+        if paginate:
+            total = res.get('count', 0)
+            if not params.get('orderByFields'):
+                # paging is only stable over an ordered result
+                params['orderByFields'] = self.objectIdField
+            tasks = list(range(0, total, page)) or [0]
+            func = lambda offset: self._query_page(url=url,
+                                                   params=params,
+                                                   offset=offset,
+                                                   count=page)
         else:
-            return FeatureSet.fromJSON(jsonValue=json.dumps(result))
+            oids = res.get('objectIds') or []
+            total = len(oids)
+            if total == 0:
+                return self._post(url=url,
+                                  securityHandler=self._securityHandler,
+                                  param_dict=params,
+                                  proxy_url=self._proxy_url,
+                                  proxy_port=self._proxy_port)
+            tasks = self._oid_chunks(oids, -(-total // page))
+            func = lambda chunk: self._query_ids(url=url,
+                                                 params=params,
+                                                 oids=chunk)
+        pool = ThreadPool(processes=max(1, min(max_workers, len(tasks))))
+        try:
+            pages = pool.map(func, tasks)
+        finally:
+            pool.close()
+            pool.join()
+        for res in pages:
+            if 'error' in res:
+                return res
+        result = pages[0]
+        for res in pages[1:]:
+            result['features'].extend(res.get('features', []))
+        if len(result.get('features', [])) < total:
+            # a page was cut short by the server
+            result['exceededTransferLimit'] = True
+        elif 'exceededTransferLimit' in result:
+            del result['exceededTransferLimit']
         return result
     #----------------------------------------------------------------------
     def query_related_records(self,
@@ -1920,30 +2288,25 @@ class FeatureLayer(abstract.BaseAGOLClass):
                         the features have M values. Otherwise, M values are
                         not returned. The default is false.
         """
-        params = {
-            "f" : "json",
-            "objectIds" : objectIds,
-            "relationshipId" : relationshipId,
-            "outFields" : outFields,
-            "returnGeometry" : returnGeometry,
-            "returnM" : returnM,
-            "returnZ" : returnZ
-        }
-        if gdbVersion is not None:
-            params['gdbVersion'] = gdbVersion
-        if definitionExpression is not None:
-            params['definitionExpression'] = definitionExpression
+        params = _pack(f="json",
+                       objectIds=_oids_to_csv(objectIds),
+                       relationshipId=relationshipId,
+                       outFields=outFields,
+                       returnGeometry=returnGeometry,
+                       returnM=returnM,
+                       returnZ=returnZ,
+                       gdbVersion=gdbVersion,
+                       definitionExpression=definitionExpression,
+                       maxAllowableOffset=maxAllowableOffset,
+                       geometryPrecision=geometryPrecision)
         if outWKID is not None:
-            params['outSR'] = SpatialReference(outWKID).asDictionary
-        if maxAllowableOffset is not None:
-            params['maxAllowableOffset'] = maxAllowableOffset
-        if geometryPrecision is not None:
-            params['geometryPrecision'] = geometryPrecision
-        quURL = self._url + "/queryRelatedRecords"
+            params['outSR'] = _to_json(_resolve_sr(outWKID))
+        quURL = self._queryRelatedRecords_url
         res = self._get(url=quURL, param_dict=params,
                            securityHandler=self._securityHandler,
                            proxy_port=self._proxy_port,
-                           proxy_url=self._proxy_url)
+                           proxy_url=self._proxy_url,
+                           use_etag=True)
         return res
     #----------------------------------------------------------------------
     def getHTMLPopup(self, oid):
@@ -1956,7 +2319,7 @@ class FeatureLayer(abstract.BaseAGOLClass):
 
         """
         if self.htmlPopupType != "esriServerHTMLPopupTypeNone":
-            popURL = self._url + "/%s/htmlPopup" % oid
+            popURL = "%s/%s/htmlPopup" % (self._url, oid)
             params = {
                 'f' : "json"
             }
@@ -1964,24 +2327,76 @@ class FeatureLayer(abstract.BaseAGOLClass):
             return self._get(url=popURL, param_dict=params,
                                 securityHandler=self._securityHandler,
                                 proxy_port=self._proxy_port,
-                                proxy_url=self._proxy_url)
+                                proxy_url=self._proxy_url,
+                                use_etag=True)
         return ""
     #----------------------------------------------------------------------
     def _chunks(self, l, n):
-        """ Yield n successive chunks from a list l.
+        """ Yield n successive chunks from a list l.  The first
+            len(l) % n chunks hold one extra item.
+        """
+        q, r = divmod(len(l), n)
+        start = 0
+        for i in range(n):
+            end = start + q + (1 if i < r else 0)
+            yield l[start:end]
+            start = end
+    #----------------------------------------------------------------------
+    def _oid_chunks(self, oids, n):
+        """ splits object ids into n chunks that each cover a contiguous
+            range of ids.  The ids only need to be ordered between chunks,
+            so with numpy the array is partitioned at the chunk boundaries
+            (O(n)) instead of being sorted.
         """
-        l.sort()
-        newn = int(1.0 * len(l) / n + 0.5)
-        for i in xrange(0, n-1):
-            yield l[i*newn:i*newn+newn]
-        yield l[n*newn-newn:]
+        if numpyFound:
+            arr = np.asarray(oids, dtype=np.int64)
+            edges = np.linspace(0, len(arr), n + 1).astype(np.int64)
+            if n > 1:
+                arr.partition(edges[1:-1])
+            return [arr[edges[i]:edges[i + 1]] for i in range(n)]
+        oids = sorted(oids)
+        return list(self._chunks(oids, n))
+    #----------------------------------------------------------------------
+    def _query_chunk(self, chunk):
+        """ returns the query result (dictionary) for a chunk of object
+            ids.  The ids are sent as the objectIds parameter, so only
+            those features are returned and no where clause is parsed.
+        """
+        return self.query(objectIds=chunk, as_json=True)
     #----------------------------------------------------------------------
-    def get_local_copy(self, out_path, includeAttachments=False):
+    def _query_chunks(self, chunks, max_workers=4):
+        """ yields the query results for the chunks of object ids in
+            order.  At most max_workers chunks are requested ahead of the
+            one being consumed, so slow consumers do not leave every
+            downloaded chunk waiting in memory.
+        """
+        workers = max(1, min(max_workers, len(chunks)))
+        pool = ThreadPool(processes=workers)
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(pool.apply_async(self._query_chunk, (chunk,)))
+                if len(pending) >= workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            pool.close()
+            pool.join()
+    #----------------------------------------------------------------------
+    def get_local_copy(self, out_path, includeAttachments=False,
+                       page_size=None, max_workers=4):
         """ exports the whole feature service to a feature class
             Input:
                out_path - path to where the data will be placed
                includeAttachments - default False. If sync is not supported
                                     then the paramter is ignored.
+               page_size - number of records requested per query when the
+                           layer is not exported with createReplica.  The
+                           default (and upper limit) is the layer's
+                           maxRecordCount.
+               max_workers - number of queries run concurrently when the
+                             layer is not exported with createReplica.
             Output:
                path to exported feature class or fgdb (as list)
         """
@@ -1990,7 +2405,7 @@ class FeatureLayer(abstract.BaseAGOLClass):
             return self.parentLayer.createReplica(replicaName="fgdb_dump",
                                                   layers="%s" % self.id,
                                                   attachmentsSyncDirection="upload",
-                                                  async=True,
+                                                  is_async=True,
                                                   wait=True,
                                                   returnAttachments=includeAttachments,
                                                   out_path=out_path)[0]
@@ -1999,38 +2414,48 @@ class FeatureLayer(abstract.BaseAGOLClass):
             return self.parentLayer.createReplica(replicaName="fgdb_dump",
                                                   layers="%s" % self.id,
                                                   attachmentsSyncDirection="upload",
-                                                  async=True,
+                                                  is_async=True,
                                                   wait=True,
                                                   returnAttachments=includeAttachments,
                                                   out_path=out_path)[0]
         else:
-            result_features = []
+            merged = None
             res = self.query(returnIDsOnly=True)
             OIDS = res['objectIds']
-            OIDS.sort()
-            OIDField = res['objectIdFieldName']
             count = len(OIDS)
-            if count <= self.maxRecordCount:
-                bins = 1
-            else:
-                bins = count / self.maxRecordCount
-                v = count % self.maxRecordCount
-                if v > 0:
-                    bins += 1
-            chunks = self._chunks(OIDS, bins)
-            for chunk in chunks:
-                chunk.sort()
-                if len(chunk) > 0:
-                    sql = "%s >= %s and %s <= %s" % (OIDField, chunk[0],
-                                                     OIDField, chunk[len(chunk) -1])
-                    temp_base = "a" + uuid.uuid4().get_hex()[:6] + "a"
-                    temp_fc = r"%s\%s" % (scratchGDB(), temp_base)
-                    temp_fc = self.query(where=sql,
-                                         returnFeatureClass=True,
-                                         out_fc=temp_fc)
-                    result_features.append(temp_fc)
-            return merge_feature_class(merges=result_features,
-                                       out_fc=out_path)
+            max_count = self.maxRecordCount
+            page = page_size or max_count
+            if max_count:
+                # the server truncates larger requests to maxRecordCount
+                page = min(page, max_count)
+            bins = max(1, -(-count // page))
+            chunks = [chunk for chunk in self._oid_chunks(OIDS, bins)
+                      if len(chunk) > 0]
+            # this thread writes each result (in order) into out_path as
+            # it arrives, so there is no merge over all the chunks once
+            # the downloads finish
+            for result in self._query_chunks(chunks, max_workers):
+                fc = self._to_featureclass(result=result)
+                if merged is None:
+                    merged = merge_feature_class(merges=[fc],
+                                                 out_fc=out_path)
+                else:
+                    append_feature_class(fc=fc, out_fc=merged)
+            return merged
+    #----------------------------------------------------------------------
+    def _post_edits(self, url, params):
+        """ posts an edit operation.  Payloads of _FORM_DATA_SIZE or more
+            are sent as multipart/form-data, which carries the JSON as is
+            instead of building a percent encoded copy of it (often twice
+            its size) in memory.
+        """
+        size = sum(len(v) for v in params.values() if _is_text(v))
+        return self._post(url=url,
+                          param_dict=params,
+                          securityHandler=self._securityHandler,
+                          proxy_port=self._proxy_port,
+                          proxy_url=self._proxy_url,
+                          force_form_post=size >= _FORM_DATA_SIZE)
     #----------------------------------------------------------------------
     def updateFeature(self,
                       features,
@@ -2045,16 +2470,13 @@ class FeatureLayer(abstract.BaseAGOLClass):
            Output:
               dictionary of result messages
         """
-        params = {
-            "f" : "json",
-            "rollbackOnFailure" : rollbackOnFailure
-        }
-        if gdbVersion is not None:
-            params['gdbVersion'] = gdbVersion
+        params = _pack(f="json",
+                       rollbackOnFailure=rollbackOnFailure,
+                       gdbVersion=gdbVersion)
         if isinstance(features, Feature):
-            params['features'] = json.dumps([features.asDictionary],
-                                            default=_date_handler
-                                            )
+            params['features'] = _dumps([features.asDictionary],
+                                        default=_date_handler
+                                        )
         elif isinstance(features, list):
             vals = []
             for feature in features:
@@ -2062,21 +2484,18 @@ class FeatureLayer(abstract.BaseAGOLClass):
                     vals.append(feature.asDictionary)
                 elif isinstance(feature, dict):
                     vals.append(feature)
-            params['features'] = json.dumps(vals,
-                                            default=_date_handler
-                                            )
+            params['features'] = _dumps(vals,
+                                        default=_date_handler
+                                        )
         elif isinstance(features, FeatureSet):
-            params['features'] = json.dumps(
+            params['features'] = _dumps(
                 [feature.asDictionary for feature in features.features],
                 default=_date_handler
             )
         else:
             return {'message' : "invalid inputs"}
-        updateURL = self._url + "/updateFeatures"
-        res = self._post(url=updateURL,
-                            securityHandler=self._securityHandler,
-                            param_dict=params, proxy_port=self._proxy_port,
-                            proxy_url=self._proxy_url)
+        updateURL = self._updateFeatures_url
+        res = self._post_edits(url=updateURL, params=params)
         return res
     #----------------------------------------------------------------------
     def deleteFeatures(self,
@@ -2108,21 +2527,16 @@ class FeatureLayer(abstract.BaseAGOLClass):
             Output:
                JSON response as dictionary
         """
-        dURL = self._url + "/deleteFeatures"
+        dURL = self._deleteFeatures_url
         params = {
             "f": "json",
             "rollbackOnFailure" : rollbackOnFailure
         }
-        if geometryFilter is not None and \
-           isinstance(geometryFilter, filters.GeometryFilter):
-            gfilter = geometryFilter.filter
-            params['geometry'] = gfilter['geometry']
-            params['geometryType'] = gfilter['geometryType']
-            params['inSR'] = gfilter['inSR']
-            params['spatialRel'] = gfilter['spatialRel']
+        _add_filters(params, geometryFilter)
         if where is not None and \
            where != "":
             params['where'] = where
+        objectIds = _oids_to_csv(objectIds)
         if objectIds is not None and \
            objectIds != "":
             params['objectIds'] = objectIds
@@ -2190,55 +2604,91 @@ class FeatureLayer(abstract.BaseAGOLClass):
            Output:
               dictionary of messages
         """
-        editURL = self._url + "/applyEdits"
-        params = {"f": "json",
-                  "useGlobalIds" : useGlobalIds,
-                  "rollbackOnFailure" : rollbackOnFailure
-                  }
-        if gdbVersion is not None:
-            params['gdbVersion'] = gdbVersion
+        editURL = self._applyEdits_url
+        params = self._build_edit_params(addFeatures=addFeatures,
+                                         updateFeatures=updateFeatures,
+                                         deleteFeatures=deleteFeatures,
+                                         gdbVersion=gdbVersion,
+                                         useGlobalIds=useGlobalIds,
+                                         rollbackOnFailure=rollbackOnFailure,
+                                         attachments=attachments)
+        res = self._post_edits(url=editURL, params=params)
+        return res
+    #----------------------------------------------------------------------
+    def _build_edit_params(self,
+                           addFeatures=None,
+                           updateFeatures=None,
+                           deleteFeatures=None,
+                           gdbVersion=None,
+                           useGlobalIds=False,
+                           rollbackOnFailure=True,
+                           attachments=None):
+        """ returns the applyEdits parameters for the given edits """
+        params = _pack(f="json",
+                       useGlobalIds=useGlobalIds,
+                       rollbackOnFailure=rollbackOnFailure,
+                       gdbVersion=gdbVersion)
         if addFeatures is None:
             addFeatures = []
         if updateFeatures is None:
             updateFeatures = []
         if len(addFeatures) > 0 and \
            isinstance(addFeatures[0], Feature):
-            params['adds'] = json.dumps([f.asDictionary for f in addFeatures],
-                                        default=_date_handler)
+            params['adds'] = _dumps([f.asDictionary for f in addFeatures],
+                                    default=_date_handler)
         elif len(addFeatures) > 0 and \
              isinstance(addFeatures[0], dict):
-            params['adds'] = json.dumps(addFeatures, default=_date_handler)
+            params['adds'] = _dumps(addFeatures, default=_date_handler)
         elif len(addFeatures) == 0:
-            params['adds'] = json.dumps(addFeatures)
+            params['adds'] = _dumps(addFeatures)
         if len(updateFeatures) > 0 and \
            isinstance(updateFeatures[0], Feature):
-            params['updates'] = json.dumps([f.asDictionary for f in updateFeatures],
-                                           default=_date_handler)
+            params['updates'] = _dumps([f.asDictionary for f in updateFeatures],
+                                       default=_date_handler)
         elif len(updateFeatures) > 0 and \
              isinstance(updateFeatures[0], dict):
-            params['updates'] = json.dumps(updateFeatures,
-                                           default=_date_handler)
+            params['updates'] = _dumps(updateFeatures,
+                                       default=_date_handler)
         elif updateFeatures is None or \
              len(updateFeatures) == 0:
-            updateFeatures = json.dumps([])
-        if deleteFeatures is not None and \
-           isinstance(deleteFeatures, str):
-            params['deletes'] = deleteFeatures
-        elif deleteFeatures is not None and \
-             isinstance(deleteFeatures, list):
-            params['deletes'] = ",".join([str(f) for f in deleteFeatures])
+            params['updates'] = _dumps([])
+        if deleteFeatures is not None:
+            params['deletes'] = _oids_to_csv(deleteFeatures)
         else:
             params['deletes'] = ""
         if attachments is None:
             params['attachments'] = ""
         else:
-            params['attachments'] = attachments
-        res = self._post(url=editURL,
-                          param_dict=params,
-                          securityHandler=self._securityHandler,
-                          proxy_port=self._proxy_port,
-                          proxy_url=self._proxy_url)
-        return res
+            params['attachments'] = _to_json(attachments)
+        return params
+    #----------------------------------------------------------------------
+    def applyEditsBatch(self, edits, max_workers=4):
+        """
+           Runs several applyEdits calls concurrently.  Each call is its
+           own edit session on the server, so batches should not depend
+           on each other (for example, updates to features added by
+           another batch).
+           Inputs:
+              edits - list of dictionaries, each holding the keyword
+                      arguments of one applyEdits call
+              max_workers - maximum number of concurrent requests
+           Output:
+              list of applyEdits results, in the order of edits
+        """
+        edits = list(edits)
+        if len(edits) == 0:
+            return []
+        editURL = self._applyEdits_url
+        pool = ThreadPool(processes=max(1, min(max_workers, len(edits))))
+        try:
+            return pool.map(
+                lambda kwargs: self._post_edits(
+                    url=editURL,
+                    params=self._build_edit_params(**kwargs)),
+                edits)
+        finally:
+            pool.close()
+            pool.join()
     #----------------------------------------------------------------------
     def addFeature(self, features,
                    gdbVersion=None,
@@ -2260,7 +2710,7 @@ class FeatureLayer(abstract.BaseAGOLClass):
            Output:
               JSON message as dictionary
         """
-        url = self._url + "/addFeatures"
+        url = self._addFeatures_url
         params = {
             "f" : "json"
         }
@@ -2271,24 +2721,20 @@ class FeatureLayer(abstract.BaseAGOLClass):
         if isinstance(features, list) and \
            len(features) > 0:
             if isinstance(features[0], Feature):
-                params['features'] = json.dumps([feature.asDictionary for feature in features],
-                                                default=_date_handler)
+                params['features'] = _dumps([feature.asDictionary for feature in features],
+                                            default=_date_handler)
             elif isinstance(features[0], dict):
-                params['features'] = json.dumps(features,
-                                                default=_date_handler)
-        elif isinstance(features, Feature):
-            params['features'] = json.dumps([features.asDictionary],
+                params['features'] = _dumps(features,
                                             default=_date_handler)
+        elif isinstance(features, Feature):
+            params['features'] = _dumps([features.asDictionary],
+                                        default=_date_handler)
         elif isinstance(features, FeatureSet):
-            params['features'] = json.dumps([feature.asDictionary for feature in features.features],
-                                            default=_date_handler)
+            params['features'] = _dumps([feature.asDictionary for feature in features.features],
+                                        default=_date_handler)
         else:
             return None
-        return self._post(url=url,
-                             param_dict=params,
-                             securityHandler=self._securityHandler,
-                             proxy_port=self._proxy_port,
-                             proxy_url=self._proxy_url)
+        return self._post_edits(url=url, params=params)
     #----------------------------------------------------------------------
     def addFeatures(self, fc, attachmentTable=None,
                     nameField="ATT_NAME", blobField="DATA",
@@ -2312,7 +2758,7 @@ class FeatureLayer(abstract.BaseAGOLClass):
         if attachmentTable is None:
             count = 0
             bins = 1
-            uURL = self._url + "/addFeatures"
+            uURL = self._addFeatures_url
             max_chunk = 250
             js = json.loads(self._unicode_convert(
                  featureclass_to_json(fc)))
@@ -2332,8 +2778,8 @@ class FeatureLayer(abstract.BaseAGOLClass):
             for chunk in chunks:
                 params = {
                     "f" : 'json',
-                    "features"  : json.dumps(chunk,
-                                             default=_date_handler)
+                    "features"  : _dumps(chunk,
+                                         default=_date_handler)
                 }
 
                 result = self._post(url=uURL, param_dict=params,
@@ -2426,22 +2872,21 @@ class FeatureLayer(abstract.BaseAGOLClass):
                                               "value" : "R1"})
         {'updatedFeatureCount': 1, 'success': True}
         """
-        url = self._url + "/calculate"
+        url = self._calculate_url
         params = {
             "f" : "json",
             "where" : where,
 
         }
         if isinstance(calcExpression, dict):
-            params["calcExpression"] = json.dumps([calcExpression],
-                                                  default=_date_handler)
+            params["calcExpression"] = _dumps([calcExpression],
+                                              default=_date_handler)
         elif isinstance(calcExpression, list):
-            params["calcExpression"] = json.dumps(calcExpression,
-                                                  default=_date_handler)
-        if sqlFormat.lower() in ['native', 'standard']:
-            params['sqlFormat'] = sqlFormat.lower()
-        else:
-            params['sqlFormat'] = "standard"
+            params["calcExpression"] = _dumps(calcExpression,
+                                              default=_date_handler)
+        fmt = sqlFormat.lower() if isinstance(sqlFormat, six.string_types) \
+              else "standard"
+        params['sqlFormat'] = fmt if fmt in _SQL_FORMATS else "standard"
         return self._post(url=url,
                              param_dict=params,
                              securityHandler=self._securityHandler,
@@ -2511,9 +2956,7 @@ class TiledService(BaseAGOLClass):
         json_dict = self._get(self._url, params,
                                  securityHandler=self._securityHandler,
                                  proxy_url=self._proxy_url, proxy_port=self._proxy_port)
-        attributes = [attr for attr in dir(self)
-                    if not attr.startswith('__') and \
-                    not attr.startswith('_')]
+        attributes = _public_attributes(type(self))
         for k,v in json_dict.items():
             if k in attributes:
                 setattr(self, "_"+ k, json_dict[k])
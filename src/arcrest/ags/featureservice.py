@@ -402,9 +402,9 @@ class FeatureService(BaseAGSServer):
         if returnIdsOnly == False and returnCountOnly == False:
             if isinstance(res, str):
                 jd = json.loads(res)
-                return [FeatureSet.fromJSON(json.dumps(lyr)) for lyr in jd['layers']]
+                return [FeatureSet.fromJSON(lyr) for lyr in jd['layers']]
             elif isinstance(res, dict):
-                return [FeatureSet.fromJSON(json.dumps(lyr)) for lyr in res['layers']]
+                return [FeatureSet.fromJSON(lyr) for lyr in res['layers']]
             else:
                 return res
         return res
@@ -934,7 +934,7 @@ class FeatureLayer_Depricated(BaseAGSServer):
                 os.remove(temp)
                 return fc
             else:
-                return FeatureSet.fromJSON(json.dumps(results))
+                return FeatureSet.fromJSON(results)
         else:
             return results
         return
@@ -876,7 +876,7 @@ class MapService(BaseAGSServer):
                                 tilePackage=False,
                                 exportExtent="DEFAULTEXTENT",
                                 areaOfInterest=None,
-                                async=True):
+                                is_async=True):
         """
         The estimateExportTilesSize operation is an asynchronous task that
         allows estimation of the size of the tile package or the cache data
@@ -919,7 +919,7 @@ class MapService(BaseAGSServer):
 	   Example: { "features": [{"geometry":{"rings":[[[-100,35],
              [-100,45],[-90,45],[-90,35],[-100,35]]],
              "spatialReference":{"wkid":4326}}}]}
-        async - (optional) the estimate function is run asynchronously
+        is_async - (optional) the estimate function is run asynchronously
          requiring the tool status to be checked manually to force it to
          run synchronously the tool will check the status until the
          estimation completes.  The default is True, which means the status
@@ -942,7 +942,7 @@ class MapService(BaseAGSServer):
                 params['areaOfInterest'] = template
             else:
                 params['areaOfInterest'] = areaOfInterest
-        if async == True:
+        if is_async == True:
             return self._get(url=url,
                                 param_dict=params,
                                 securityHandler=self._securityHandler,
@@ -978,7 +978,7 @@ class MapService(BaseAGSServer):
                     optimizeTilesForSize=True,
                     compressionQuality=0,
                     areaOfInterest=None,
-                    async=False
+                    is_async=False
                     ):
         """
         The exportTiles operation is performed as an asynchronous task and
@@ -1053,7 +1053,7 @@ class MapService(BaseAGSServer):
         Example: { "features": [{"geometry":{"rings":[[[-100,35],
          [-100,45],[-90,45],[-90,35],[-100,35]]],
          "spatialReference":{"wkid":4326}}}]}
-        async - default True, this value ensures the returns are returned
+        is_async - default True, this value ensures the returns are returned
          to the user instead of the user having the check the job status
          manually.
         """
@@ -1071,7 +1071,7 @@ class MapService(BaseAGSServer):
             geom = areaOfInterest.asDictionary()
             template = { "features": [geom]}
             params["areaOfInterest"] = template
-        if async == True:
+        if is_async == True:
             return self._get(url=url, param_dict=params,
                             proxy_url=self._proxy_url,
                             proxy_port=self._proxy_port)
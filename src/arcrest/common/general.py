@@ -2,6 +2,7 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 import datetime
+import decimal
 import time
 import json
 try:
@@ -41,12 +42,6 @@ def _unicode_convert(obj):
     else:
         return obj
 #----------------------------------------------------------------------
-def _date_handler(obj):
-    if isinstance(obj, datetime.datetime):
-        return local_time_to_online(obj)
-    else:
-        return obj
-#----------------------------------------------------------------------
 def local_time_to_online(dt=None):
     """
        converts datetime object to a UTC timestamp for AGOL
@@ -63,6 +58,24 @@ def local_time_to_online(dt=None):
 
     return (time.mktime(dt.timetuple())  * 1000) + (utc_offset *1000)
 #----------------------------------------------------------------------
+# JSON encoders for the non-native values found in feature attributes
+_ENCODERS = {
+    datetime.datetime : local_time_to_online,
+    datetime.date : local_time_to_online,
+    decimal.Decimal : float
+}
+def _date_handler(obj):
+    encoder = _ENCODERS.get(type(obj))
+    if encoder is None:
+        # subclasses, such as pandas Timestamps, miss the exact type lookup
+        for kind, func in _ENCODERS.items():
+            if isinstance(obj, kind):
+                encoder = func
+                break
+        else:
+            return obj
+    return encoder(obj)
+#----------------------------------------------------------------------
 def online_time_to_string(value, timeFormat, utcOffset=0):
     """Converts AGOL timestamp to formatted string.
 
@@ -104,7 +117,6 @@ def timestamp_to_datetime(timestamp):
 ########################################################################
 class Feature(object):
     """ returns a feature  """
-    _json = None
     _dict = None
     _geom = None
     _geomType = None
@@ -131,7 +143,6 @@ class Feature(object):
                     self._wkt = spatialReference['wkt']
                 self._dict['geometry'].update({'spatialReference':spatialReference})
             self._geom = self.geometry
-        self._json = json.dumps(self._dict, default=_date_handler)
     #----------------------------------------------------------------------
     def set_value(self, field_name, value):
         """ sets an attribute value for a given field name """
@@ -156,7 +167,6 @@ class Feature(object):
             self._geom = self.geometry
         else:
             return False
-        self._json = json.dumps(self._dict, default=_date_handler)
         return True
     #----------------------------------------------------------------------
     def get_value(self, field_name):
@@ -607,8 +617,12 @@ class FeatureSet(object):
     #----------------------------------------------------------------------
     @staticmethod
     def fromJSON(jsonValue):
-        """returns a featureset from a JSON string"""
-        jd = json.loads(jsonValue)
+        """returns a featureset from a JSON string or an already parsed
+        dictionary"""
+        if isinstance(jsonValue, dict):
+            jd = jsonValue
+        else:
+            jd = json.loads(jsonValue)
         features = []
         if 'fields' in jd:
             fields = jd['fields']
@@ -21,6 +21,7 @@ class SpatialReference(abstract.AbstractGeometry):
     """ creates a spatial reference instance """
     _wkid = None
     _wkt = None
+    _json = None
     #----------------------------------------------------------------------
     def __init__(self, wkid=None,wkt=None):
         """Constructor"""
@@ -35,6 +36,7 @@ class SpatialReference(abstract.AbstractGeometry):
     def wkid(self, wkid):
         """ get/set the wkid """
         self._wkid = wkid
+        self._json = None
     #----------------------------------------------------------------------
     @property
     def wkt(self):
@@ -44,6 +46,16 @@ class SpatialReference(abstract.AbstractGeometry):
     def wkt(self, wkt):
         """ get/set the wkt """
         self._wkt = wkt
+        self._json = None
+    #----------------------------------------------------------------------
+    @property
+    def asJSON(self):
+        """ returns the spatial reference as JSON, serialized once and
+            reused until the wkid or wkt changes """
+        if self._json is None:
+            self._json = json.dumps(self.asDictionary)
+        return self._json
+    #----------------------------------------------------------------------
     @property
     def asDictionary(self):
         """returns the wkid id for use in json calls"""
@@ -137,6 +137,19 @@ def merge_feature_class(merges, out_fc, cleanUp=True):
             del m
         return merged
 #----------------------------------------------------------------------
+def append_feature_class(fc, out_fc, cleanUp=True):
+    """ appends the rows of a featureclass (or table) to an existing
+        out_fc, which must share its schema
+    """
+    if arcpyFound == False:
+        raise Exception("ArcPy is required to use this function")
+    result = arcpy.Append_management(inputs=fc,
+                                     target=out_fc,
+                                     schema_type="NO_TEST")[0]
+    if cleanUp:
+        arcpy.Delete_management(fc)
+    return result
+#----------------------------------------------------------------------
 def scratchFolder():
     """ returns the scratch foldre """
     if arcpyFound == False:
@@ -12,10 +12,11 @@ import sys
 import json
 import uuid
 import zlib
-from inspect import getargspec
 import shutil
 import tempfile
 import mimetypes
+import threading
+from collections import OrderedDict
 import email.generator
 
 from io import BytesIO
@@ -23,11 +24,32 @@ try:
     from cStringIO import StringIO
 except ImportError:
     from io import StringIO
+try:
+    import orjson
+    orjsonFound = True
+except ImportError:
+    orjsonFound = False
 
+from ..packages import six
 from ..packages.six.moves.urllib import request
+from ..packages.six.moves.urllib.error import HTTPError
 from ..packages.six.moves import http_cookiejar as cookiejar
 from ..packages.six.moves.urllib_parse import urlencode
 
+#----------------------------------------------------------------------
+def _loads(data):
+    """ parses a JSON response body (bytes or text), using orjson when it
+        is installed.  Bodies orjson rejects, such as ones containing NaN,
+        are handed to the standard json module.
+    """
+    if orjsonFound:
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            pass
+    if isinstance(data, bytes) and not isinstance(data, str):
+        data = data.decode('utf-8')
+    return json.loads(data)
 ########################################################################
 __version__ = "3.5.9"
 ########################################################################
@@ -67,6 +89,60 @@ class RedirectHandler(request.HTTPRedirectHandler):
         result.status = code
         return result
 ########################################################################
+class MultiPartStream(object):
+    """File-like multipart/form-data body.  Uploaded files are read from
+    disk as the request is sent instead of being copied into memory."""
+    #----------------------------------------------------------------------
+    def __init__(self, parts):
+        """parts - list of byte strings and ('file', path) tuples"""
+        self._parts = list(parts)
+        self._length = 0
+        for part in self._parts:
+            if isinstance(part, tuple):
+                self._length += os.path.getsize(part[1])
+            else:
+                self._length += len(part)
+        self._index = 0
+        self._current = None
+    #----------------------------------------------------------------------
+    def __len__(self):
+        return self._length
+    #----------------------------------------------------------------------
+    def _next_part(self):
+        """opens the next part of the body as a file-like object"""
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        if self._index >= len(self._parts):
+            return None
+        part = self._parts[self._index]
+        self._index += 1
+        if isinstance(part, tuple):
+            self._current = open(part[1], 'rb')
+        else:
+            self._current = BytesIO(part)
+        return self._current
+    #----------------------------------------------------------------------
+    def read(self, size=-1):
+        """reads up to size bytes of the body, or all of it if size < 0"""
+        chunks = []
+        current = self._current or self._next_part()
+        while current is not None and size != 0:
+            data = current.read(size)
+            if not data:
+                current = self._next_part()
+                continue
+            chunks.append(data)
+            if size > 0:
+                size -= len(data)
+        return b"".join(chunks)
+    #----------------------------------------------------------------------
+    def close(self):
+        """closes any file left open by the stream"""
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+########################################################################
 class MultiPartForm(object):
     """Accumulate the data to be used when posting a form."""
     PY2 = sys.version_info[0] == 2
@@ -139,6 +215,41 @@ class MultiPartForm(object):
             self._3()
         return self.form_data
     #----------------------------------------------------------------------
+    @property
+    def make_stream(self):
+        """returns the form as a MultiPartStream so file contents are
+        streamed from disk rather than held in memory"""
+        def encode(value):
+            if isinstance(value, bytes):
+                return value
+            return value.encode('utf-8')
+        boundary = self.boundary
+        parts = []
+        for (key, value) in self.form_fields:
+            parts.append(encode(
+                '--{boundary}\r\n'
+                'Content-Disposition: form-data; name="{key}"\r\n\r\n'.format(
+                    boundary=boundary, key=key)))
+            # the value is its own part so large JSON fields are encoded
+            # once rather than copied into a formatted string first
+            if not isinstance(value, (bytes, six.string_types)):
+                value = str(value)
+            parts.append(encode(value))
+            parts.append(b'\r\n')
+        for (key, filename, mimetype, filepath) in self.files:
+            if os.path.isfile(filepath):
+                parts.append(encode(
+                    '--{boundary}\r\n'
+                    'Content-Disposition: form-data; name="{key}"; '
+                    'filename="{filename}"\r\n'
+                    'Content-Type: {content_type}\r\n\r\n'.format(
+                        boundary=boundary, key=key, filename=filename,
+                        content_type=mimetype)))
+                parts.append(('file', filepath))
+                parts.append(b'\r\n')
+        parts.append(encode('--{}--\r\n\r\n'.format(boundary)))
+        return MultiPartStream(parts)
+    #----------------------------------------------------------------------
     def _2(self):
         """python 2.x version of formatting body data"""
         boundary = self.boundary
@@ -202,9 +313,56 @@ class BaseWebOperations(BaseOperation):
     _last_method = None
     _useragent = "Mozilla/5.0 (Windows NT 6.3; rv:36.0) Gecko/20100101 Firefox/36.0"
     _verify = False
+    _unverified_ctx = None
+    _etag_cache = OrderedDict()
+    _etag_lock = threading.Lock()
+    _etag_cache_size = 128
+    # larger response bodies are not kept in the etag cache
+    _etag_max_body = 262144
     def __init__(self, verify=False):
         self._verify = verify
     #----------------------------------------------------------------------
+    def _ssl_context(self):
+        """returns the SSL context used when verify is False.  Creating a
+        context loads the system certificate store, so a single context is
+        built and shared by every web operation.
+        """
+        if BaseWebOperations._unverified_ctx is None:
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+            BaseWebOperations._unverified_ctx = ctx
+        return BaseWebOperations._unverified_ctx
+    #----------------------------------------------------------------------
+    def _etag_lookup(self, key):
+        """returns the (etag, body) pair last stored for a request url, or
+        None.  The cache is shared by every web operation and keeps the
+        most recently used urls.
+        """
+        with BaseWebOperations._etag_lock:
+            value = BaseWebOperations._etag_cache.pop(key, None)
+            if value is not None:
+                BaseWebOperations._etag_cache[key] = value
+            return value
+    #----------------------------------------------------------------------
+    def _etag_store(self, key, etag, body):
+        """remembers the etag and raw body of a response.  Bodies larger
+        than _etag_max_body bytes are not kept.
+        """
+        with BaseWebOperations._etag_lock:
+            cache = BaseWebOperations._etag_cache
+            cache.pop(key, None)
+            if len(body) > BaseWebOperations._etag_max_body:
+                return
+            cache[key] = (etag, body)
+            while len(cache) > BaseWebOperations._etag_cache_size:
+                cache.popitem(last=False)
+    #----------------------------------------------------------------------
+    def clear_etag_cache(self):
+        """removes every response remembered for ETag revalidation"""
+        with BaseWebOperations._etag_lock:
+            BaseWebOperations._etag_cache.clear()
+    #----------------------------------------------------------------------
     @property
     def last_method(self):
         """gets the last method used (either POST or GET)"""
@@ -313,17 +471,12 @@ class BaseWebOperations(BaseOperation):
                 del writer
             return file_name
         else:
-            read = ""
-            for data in self._chunk(response=resp, size=4096):
-                if self.PY3 == True:
-                    read += data.decode('utf-8')
-                else:
-                    read += data
-
-                del data
+            read = b"".join(self._chunk(response=resp, size=4096))
             try:
-                return json.loads(read.strip())
+                return _loads(read)
             except:
+                if self.PY3 == True:
+                    return read.decode('utf-8')
                 return read
         return None
     #----------------------------------------------------------------------
@@ -427,9 +580,7 @@ class BaseWebOperations(BaseOperation):
         if self._verify == False and \
            sys.version_info[0:3] >= (2, 7, 9) and \
             hasattr(ssl,'create_default_context'):
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
+            ctx = self._ssl_context()
             custom_handlers.append(request.HTTPSHandler(context=ctx))
         if len(files) == 0 and force_form_post == False:
             self._last_method = "POST"
@@ -464,17 +615,8 @@ class BaseWebOperations(BaseOperation):
         for k,v in additional_headers.items():
             headers[k] = v
             del k,v
-        hasContext = 'context' in self._has_context(request.urlopen)
-        if self._verify == False and \
-           sys.version_info[0:3] >= (2, 7, 9) and \
-            hasattr(ssl,'create_default_context'):
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-
         opener = request.build_opener(*handlers)
         opener.addheaders = [(k,v) for k,v in headers.items()]
-        request.install_opener(opener)
         if force_form_post == False:
             data = urlencode(param_dict)
             if self.PY3:
@@ -485,24 +627,21 @@ class BaseWebOperations(BaseOperation):
                                   headers=headers)
             for k,v in headers.items():
                 req.add_header(k,v)
-            if hasContext and self._verify == False:
-                resp = request.urlopen(req, context=ctx)
-            else:
-                resp = request.urlopen(req)
+            resp = opener.open(req)
         else:
             mpf = MultiPartForm(param_dict=param_dict,
                                 files=files)
             req = request.Request(self._asString(url), headers=headers)
-            body = mpf.make_result
+            body = mpf.make_stream
+            # assigning data drops any Content-length header, so set it first
+            req.data = body
             req.add_header('User-agent', self.useragent)
             req.add_header('Content-type', mpf.get_content_type())
             req.add_header('Content-length', len(body))
-            req.data = body
-            if 'context' in self._has_context(request.urlopen) and \
-               self._verify == False:
-                resp = request.urlopen(req, context=ctx)
-            else:
-                resp = request.urlopen(req)
+            try:
+                resp = opener.open(req)
+            finally:
+                body.close()
             del body, mpf
         self._last_code = resp.getcode()
         self._last_url = resp.geturl()
@@ -558,11 +697,19 @@ class BaseWebOperations(BaseOperation):
              compress=True,
              custom_handlers=None,
              out_folder=None,
-             file_name=None):
+             file_name=None,
+             use_etag=False,
+             force_download=False):
         """
         Performs a GET operation
         Inputs:
-
+           use_etag - if True, the ETag of a JSON response is remembered
+                      and sent as If-None-Match on the next request to the
+                      same url.  A 304 Not Modified response returns the
+                      remembered body.
+           force_download - if True, the response is saved to out_folder
+                            (as file_name when given) whatever its content
+                            type.
         Output:
            returns dictionary, string or None
         """
@@ -605,9 +752,7 @@ class BaseWebOperations(BaseOperation):
         if self._verify == False and \
            sys.version_info[0:3] >= (2, 7, 9) and \
             hasattr(ssl,'create_default_context'):
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
+            ctx = self._ssl_context()
             handlers.append(request.HTTPSHandler(context=ctx))
         if cj is not None:
             handlers.append(request.HTTPCookieProcessor(cj))
@@ -618,72 +763,45 @@ class BaseWebOperations(BaseOperation):
                        "https":"https://%s:%s" % (proxy_url, proxy_port)}
             proxy_support = request.ProxyHandler(proxies)
             handlers.append(proxy_support)
+        # requests go through this opener rather than the global
+        # urlopen, so concurrent calls never pick up each other's
+        # handlers and the SSL context above is always applied
         opener = request.build_opener(*handlers)
-
         opener.addheaders = headers
-        request.install_opener(opener)
-        ctx = None
-        hasContext = False
-        if self._verify == False and \
-           'context' in self._has_context(request.urlopen) and \
-            sys.version_info[0:3] >= (2, 7, 9) and \
-            hasattr(ssl,'create_default_context'):
-            ctx = ssl.create_default_context()
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-            hasContext = True
-
-        if hasContext == False:
-
-            if param_dict is None:
-                req = request.Request(self._asString(url),
-                                      headers=pass_headers)
-                resp = request.urlopen(req)
-            elif len(str(urlencode(param_dict))) + len(url) >= 1999:
-                return self._post(
-                    url=url,
-                    param_dict=param_dict,
-                    files=None,
-                    securityHandler=securityHandler,
-                    additional_headers=additional_headers,
-                    custom_handlers=custom_handlers,
-                    proxy_url=proxy_url,
-                    proxy_port=proxy_port,
-                    compress=compress,
-                    out_folder=out_folder,
-                    file_name=file_name,
-                    force_form_post=False)
-            else:
-                format_url = self._asString(url) + "?%s" % urlencode(param_dict)
-                req = request.Request(format_url,
-                                      headers=pass_headers)
-                resp = request.urlopen(req)
+        if param_dict is None:
+            req = request.Request(self._asString(url),
+                                  headers=pass_headers)
+        elif len(str(urlencode(param_dict))) + len(url) >= 1999:
+            return self._post(
+                url=url,
+                param_dict=param_dict,
+                files=None,
+                securityHandler=securityHandler,
+                additional_headers=additional_headers,
+                custom_handlers=custom_handlers,
+                proxy_url=proxy_url,
+                proxy_port=proxy_port,
+                compress=compress,
+                out_folder=out_folder,
+                file_name=file_name,
+                force_form_post=False)
         else:
-            if param_dict is None:
-                req = request.Request(self._asString(url),
-                                      headers=pass_headers)
-                resp = request.urlopen(req,
-                                       context=ctx)
-            elif len(str(urlencode(param_dict))) + len(url) >= 1999:
-                return self._post(
-                    url=url,
-                    param_dict=param_dict,
-                    files=None,
-                    securityHandler=securityHandler,
-                    additional_headers=additional_headers,
-                    custom_handlers=custom_handlers,
-                    proxy_url=proxy_url,
-                    proxy_port=proxy_port,
-                    compress=compress,
-                    out_folder=out_folder,
-                    file_name=file_name,
-                    force_form_post=False)
-            else:
-                format_url = self._asString(url) + "?%s" % urlencode(param_dict)
-                req = request.Request(format_url,
-                                      headers=pass_headers)
-                resp = request.urlopen(req,
-                                       context=ctx)
+            format_url = self._asString(url) + "?%s" % urlencode(param_dict)
+            req = request.Request(format_url,
+                                  headers=pass_headers)
+        etag_key = None
+        cached = None
+        if use_etag:
+            etag_key = req.get_full_url()
+            cached = self._etag_lookup(etag_key)
+            if cached is not None:
+                req.add_header('If-None-Match', cached[0])
+        try:
+            resp = opener.open(req)
+        except HTTPError as e:
+            if e.code == 304 and cached is not None:
+                return _loads(cached[1])
+            raise
         self._last_code = resp.getcode()
         self._last_url = resp.geturl()
         #  Get some headers from the response
@@ -693,16 +811,21 @@ class BaseWebOperations(BaseOperation):
         #contentEncoding = resp.headers.get('content-encoding')
         contentType = resp.headers.get('content-Type').split(';')[0].lower()
         contentLength = resp.headers.get('content-length')
-        if maintype.lower() in ('image',
+        if force_download or \
+           maintype.lower() in ('image',
                                 'application/x-zip-compressed') or \
            contentType in ('application/x-zip-compressed', 'application/octet-stream') or \
            contentMD5 is not None or\
            (contentDisposition is not None and \
             contentDisposition.lower().find('attachment;') > -1):
-
-            fname = self._get_file_name(
-                contentDisposition=contentDisposition,
-                url=url)
+            # files are streamed to disk in 1 MB pieces
+            CHUNK = 1048576
+            if file_name is None:
+                fname = self._get_file_name(
+                    contentDisposition=contentDisposition,
+                    url=url)
+            else:
+                fname = file_name
             if out_folder is None:
                 out_folder = tempfile.gettempdir()
             if contentLength is not None:
@@ -714,22 +837,16 @@ class BaseWebOperations(BaseOperation):
                 for data in self._chunk(response=resp,
                                         size=CHUNK):
                     writer.write(data)
-                    writer.flush()
                 writer.flush()
                 del writer
             return file_name
         else:
-            read = ""
-            for data in self._chunk(response=resp,
-                                    size=CHUNK):
-                if self.PY3 == True:
-                    read += data.decode('utf-8')
-                else:
-                    read += data
-
-                del data
+            # chunks are joined as bytes and decoded once, which avoids
+            # quadratic string building and splitting multi-byte characters
+            read = b"".join(self._chunk(response=resp,
+                                        size=CHUNK))
             try:
-                results = json.loads(read)
+                results = _loads(read)
                 if 'error' in results:
                     if 'message' in results['error']:
                         if results['error']['message'] == 'Request not made over ssl':
@@ -745,7 +862,14 @@ class BaseWebOperations(BaseOperation):
                                                  compress,
                                                  custom_handlers,
                                                  out_folder,
-                                                 file_name)
+                                                 file_name,
+                                                 use_etag,
+                                                 force_download)
+                elif etag_key is not None and \
+                     resp.headers.get('ETag') is not None:
+                    self._etag_store(etag_key, resp.headers.get('ETag'), read)
                 return results
             except:
+                if self.PY3 == True:
+                    return read.decode('utf-8')
                 return read
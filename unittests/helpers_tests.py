@@ -0,0 +1,96 @@
+# coding: utf-8
+import datetime
+import decimal
+import os
+import shutil
+import tempfile
+import unittest
+
+from arcrest.agol import services
+from arcrest.agol.services import FeatureLayer, _oids_to_csv
+from arcrest.common.general import _date_handler, local_time_to_online
+from arcrest.web._base import MultiPartForm
+
+
+class ChunkTests(unittest.TestCase):
+    def setUp(self):
+        self.layer = FeatureLayer(url="http://localhost/FeatureServer/0")
+
+    def test_chunks_should_split_evenly_without_empty_chunks(self):
+        chunks = list(self.layer._chunks(list(range(10)), 6))
+        self.assertEqual([2, 2, 2, 2, 1, 1], [len(c) for c in chunks])
+        self.assertEqual(list(range(10)), sum(chunks, []))
+
+    def test_oid_chunks_should_cover_ordered_ranges(self):
+        oids = [7, 3, 10, 1, 9, 2, 8, 6, 5, 4]
+        found = services.numpyFound
+        try:
+            for use_numpy in set([False, found]):
+                services.numpyFound = use_numpy
+                chunks = [list(c) for c in self.layer._oid_chunks(oids, 3)]
+                self.assertEqual(3, len(chunks))
+                self.assertEqual(sorted(oids), sorted(sum(chunks, [])))
+                for left, right in zip(chunks, chunks[1:]):
+                    self.assertLess(max(left), min(right))
+        finally:
+            services.numpyFound = found
+
+
+class OidsToCsvTests(unittest.TestCase):
+    def test_sequences_should_be_joined(self):
+        self.assertEqual("1,2,3", _oids_to_csv([1, 2, 3]))
+        self.assertEqual("1,2,3", _oids_to_csv((1, 2, 3)))
+
+    def test_text_should_be_returned_as_is(self):
+        self.assertEqual("1,2", _oids_to_csv("1,2"))
+
+    @unittest.skipUnless(services.numpyFound, "numpy is not installed")
+    def test_numpy_array_should_be_joined(self):
+        import numpy as np
+        self.assertEqual("4,5,6", _oids_to_csv(np.array([4, 5, 6])))
+
+
+class DateHandlerTests(unittest.TestCase):
+    def test_datetime_and_date_should_be_online_time(self):
+        dt = datetime.datetime(2020, 1, 1)
+        self.assertEqual(local_time_to_online(dt), _date_handler(dt))
+        self.assertEqual(local_time_to_online(dt),
+                         _date_handler(datetime.date(2020, 1, 1)))
+
+    def test_datetime_subclass_should_be_online_time(self):
+        class Timestamp(datetime.datetime):
+            pass
+        dt = Timestamp(2020, 1, 1)
+        self.assertEqual(local_time_to_online(dt), _date_handler(dt))
+
+    def test_decimal_should_be_float(self):
+        self.assertEqual(1.5, _date_handler(decimal.Decimal("1.5")))
+
+    def test_other_values_should_be_returned_as_is(self):
+        value = object()
+        self.assertIs(value, _date_handler(value))
+
+
+class MultiPartStreamTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "upload.txt")
+        with open(self.path, "wb") as writer:
+            writer.write(b"file contents\r\n" * 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_stream_should_match_result(self):
+        form = MultiPartForm(param_dict={"f": "json", "count": 3},
+                             files={"file": self.path})
+        stream = form.make_stream
+        try:
+            body = stream.read(7) + stream.read()
+        finally:
+            stream.close()
+        expected = form.make_result
+        if not isinstance(expected, bytes):
+            expected = expected.encode("utf-8")
+        self.assertEqual(expected, body)
+        self.assertEqual(len(expected), len(stream))